@@ -7,7 +7,10 @@ API REST para coleta de mídias do Instagram otimizada para N8N
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
+from pathlib import Path
+import asyncio
 import uvicorn
 from datetime import datetime
 
@@ -33,6 +36,7 @@ async def lifespan(app: FastAPI):
     - Inicializa CollectionService
     - Verifica pool de contas
     - Configura logs
+    - Agenda limpeza de sessões de onboarding
     
     Shutdown:
     - Executa limpeza de recursos
@@ -70,12 +74,16 @@ async def lifespan(app: FastAPI):
         logger.error(f"❌ Erro na inicialização: {e}")
         raise
     
+    # Limpeza periódica das sessões de onboarding abandonadas
+    onboarding_gc = asyncio.create_task(onboarding_ui.session_gc_loop())
+    
     logger.success("🎉 API inicializada com sucesso!")
     
     yield
     
     # === SHUTDOWN ===
     logger.info("🛑 Finalizando Instagram Collection API")
+    onboarding_gc.cancel()
     
     try:
         # Executar limpeza
@@ -177,6 +185,24 @@ app.include_router(router, prefix="", tags=["Instagram Collection"])
 # >>> ADICIONE O ROUTER DA UI <<<
 app.include_router(onboarding_ui.router)
 
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles com cache longo no browser (versionar a URL ao mudar o arquivo, ex.: ?v=2)"""
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+# Assets estáticos da UI (CSS do onboarding)
+app.mount(
+    "/static",
+    CachedStaticFiles(directory=Path(__file__).resolve().parent.parent / "static"),
+    name="static",
+)
+
 # Exception handlers
 app.add_exception_handler(HTTPException, http_exception_handler)
 app.add_exception_handler(Exception, general_exception_handler)
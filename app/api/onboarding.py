@@ -10,125 +10,309 @@ Fluxo:
    - Se ChallengeRequired/TwoFactorRequired: mostra formulário de código + console de logs.
 3) POST /adicionar-insta/confirmar -> recebe código e tenta concluir login (CHALLENGE/2FA).
 4) POST /adicionar-insta/cancelar  -> cancela a sessão de onboarding.
+5) GET  /adicionar-insta/logs/{id}   -> logs da sessão em JSON.
+6) GET  /adicionar-insta/stream/{id} -> logs ao vivo via Server-Sent Events (usado pelo console).
 """
 
-from fastapi import APIRouter, Form, Request
+from fastapi import APIRouter, Depends, Form, HTTPException, Request
 from fastapi.responses import HTMLResponse
-from typing import Optional, Dict, Any, List
-from uuid import uuid4
+from starlette.concurrency import run_in_threadpool
+from sse_starlette.sse import EventSourceResponse
+from typing import Optional, Dict, Any, List, Iterator, AsyncIterator, Tuple
 from pathlib import Path
-import json
+from contextlib import contextmanager
+from collections import OrderedDict
+from functools import lru_cache
+import asyncio
+import secrets
+import sqlite3
+import threading
 import time
 
+from jinja2 import DictLoader, Environment
+from markupsafe import Markup
+
 from instagrapi import Client
 from instagrapi.exceptions import ChallengeRequired, TwoFactorRequired, LoginRequired
 
+try:
+    from instagrapi.mixins.challenge import ChallengeChoice
+except Exception:
+    ChallengeChoice = object  # fallback tipagem
+
 from app.config import Settings
 from app.utils.logging_config import get_app_logger
 from app.api.routes import get_collection_service
+from app.core.account_pool import AccountPool
+from app.core.collection_service import CollectionService
 
 router = APIRouter(tags=["Onboarding UI"])
 logger = get_app_logger(__name__)
 
 # -----------------------------
-# Persistência simples da sessão
+# Persistência da sessão (SQLite, uma conexão por processo)
 # -----------------------------
 _settings = Settings()
-_ONB_DIR = Path(_settings.session_dir) / "onboarding"
-_ONB_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def _onb_path(onb_id: str) -> Path:
-    return _ONB_DIR / f"{onb_id}.json"
+Path(_settings.session_dir).mkdir(parents=True, exist_ok=True)
+
+_db = sqlite3.connect(
+    str(Path(_settings.session_dir) / "onboarding.sqlite"),
+    check_same_thread=False,
+    isolation_level=None,  # autocommit; transações explícitas via _tx()
+    timeout=10.0,          # espera até 10s pelo lock de escrita de outro processo/worker
+)
+_db.row_factory = sqlite3.Row
+_db.execute("PRAGMA journal_mode=WAL")
+_db.execute("PRAGMA synchronous=NORMAL")
+_db.executescript("""
+CREATE TABLE IF NOT EXISTS onboarding (
+    id         TEXT PRIMARY KEY,
+    username   TEXT NOT NULL,
+    password   TEXT NOT NULL,
+    proxy      TEXT,
+    status     TEXT NOT NULL,   -- INIT | NEED_CODE | DONE | CANCELED
+    flow       TEXT,            -- CHALLENGE | TWO_FACTOR
+    created_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS onboarding_log (
+    id  TEXT NOT NULL,
+    ts  INTEGER NOT NULL,
+    msg TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_onboarding_log_id ON onboarding_log (id);
+""")
+
+# Handlers de login rodam no threadpool: serializa o uso da conexão compartilhada
+_db_lock = threading.RLock()
+
+_MAX_LOGS = 400  # linhas mantidas por sessão (o console mostra as últimas 200)
+_SESSION_TTL_SECONDS = 3600  # sessões não concluídas mais velhas que isso são descartadas
+_GC_INTERVAL_SECONDS = 900
+
+
+@contextmanager
+def _tx() -> Iterator[sqlite3.Connection]:
+    # IMMEDIATE pega o lock de escrita já no início: commit atômico e sem "database is locked"
+    # ao promover leitura->escrita quando há mais de um worker.
+    with _db_lock:
+        _db.execute("BEGIN IMMEDIATE")
+        try:
+            yield _db
+        except BaseException:
+            _db.execute("ROLLBACK")
+            raise
+        _db.execute("COMMIT")
 
 
 def _new_onb(username: str, password: str, proxy: Optional[str]) -> str:
-    onb_id = str(uuid4())
-    data = {
-        "id": onb_id,
-        "username": username.strip(),
-        "password": password,
-        "proxy": proxy.strip() if proxy else None,
-        "status": "INIT",        # INIT | NEED_CODE | DONE | CANCELED
-        "flow": None,            # "CHALLENGE" | "TWO_FACTOR"
-        "logs": [],              # lista de strings
-        "created_at": int(time.time()),
-    }
-    _save_onb(onb_id, data)
+    onb_id = secrets.token_urlsafe(16)  # 128 bits, 22 chars URL-safe
+    with _db_lock:
+        _db.execute(
+            "INSERT INTO onboarding (id, username, password, proxy, status, flow, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (onb_id, username.strip(), password, proxy.strip() if proxy else None, "INIT", None, int(time.time())),
+        )
     return onb_id
 
 
 def _save_onb(onb_id: str, data: Dict[str, Any]) -> None:
-    _onb_path(onb_id).write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    # Apenas status/flow mudam ao longo do onboarding; logs acumulados via _push_log
+    # são gravados na mesma transação.
+    pending = data.pop("logs", None) or []
+    with _tx() as db:
+        db.execute(
+            "UPDATE onboarding SET status = ?, flow = ? WHERE id = ?",
+            (data.get("status"), data.get("flow"), onb_id),
+        )
+        if pending:
+            db.executemany(
+                "INSERT INTO onboarding_log (id, ts, msg) VALUES (?, ?, ?)",
+                [(onb_id, ts, msg) for ts, msg in pending],
+            )
+            _trim_logs(db, onb_id)
 
 
 def _load_onb(onb_id: str) -> Optional[Dict[str, Any]]:
-    p = _onb_path(onb_id)
-    if not p.exists():
-        return None
-    try:
-        return json.loads(p.read_text(encoding="utf-8"))
-    except Exception:
-        return None
+    with _db_lock:
+        row = _db.execute("SELECT * FROM onboarding WHERE id = ?", (onb_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def _delete_onb(onb_id: str) -> bool:
+    """Remove a sessão e seus logs; retorna se a sessão existia."""
+    with _tx() as db:
+        db.execute("DELETE FROM onboarding_log WHERE id = ?", (onb_id,))
+        deleted = db.execute("DELETE FROM onboarding WHERE id = ?", (onb_id,)).rowcount > 0
+    _drop_client(onb_id)
+    return deleted
+
 
+def _trim_logs(db: sqlite3.Connection, onb_id: str) -> None:
+    # Remove tudo abaixo da linha _MAX_LOGS mais recente (no-op enquanto a sessão for curta)
+    db.execute(
+        "DELETE FROM onboarding_log WHERE id = ? AND rowid <= ("
+        " SELECT rowid FROM onboarding_log WHERE id = ? ORDER BY rowid DESC LIMIT 1 OFFSET ?)",
+        (onb_id, onb_id, _MAX_LOGS),
+    )
 
-def _delete_onb(onb_id: str) -> None:
-    _onb_path(onb_id).unlink(missing_ok=True)
+
+def _append_logs(onb_id: str, msgs: List[str]) -> None:
+    """Grava várias linhas de log numa única transação."""
+    ts = int(time.time())
+    with _tx() as db:
+        db.executemany("INSERT INTO onboarding_log (id, ts, msg) VALUES (?, ?, ?)", [(onb_id, ts, m) for m in msgs])
+        _trim_logs(db, onb_id)
 
 
 def _append_log(onb_id: str, msg: str) -> None:
-    data = _load_onb(onb_id)
-    if not data:
+    _append_logs(onb_id, [msg])
+
+
+def _push_log(data: Dict[str, Any], msg: str) -> Dict[str, Any]:
+    """Acumula um log em memória; persistido no próximo _save_onb."""
+    data.setdefault("logs", []).append((int(time.time()), msg))
+    return data
+
+
+def _load_onb_logs(onb_id: str, limit: int = 200) -> List[str]:
+    with _db_lock:
+        rows = _db.execute(
+            "SELECT ts, msg FROM onboarding_log WHERE id = ? ORDER BY rowid DESC LIMIT ?",
+            (onb_id, limit),
+        ).fetchall()
+    return [f"[{_fmt_ts(ts)}] {msg}" for ts, msg in reversed(rows)]
+
+
+def _load_onb_logs_since(onb_id: str, after_rowid: int, limit: int = 200) -> Tuple[bool, List[Tuple[int, str]]]:
+    """Retorna (sessão ainda existe, [(rowid, linha)]) com os logs posteriores a after_rowid."""
+    with _db_lock:
+        alive = _db.execute("SELECT 1 FROM onboarding WHERE id = ?", (onb_id,)).fetchone() is not None
+        rows = _db.execute(
+            "SELECT rowid, ts, msg FROM onboarding_log WHERE id = ? AND rowid > ? ORDER BY rowid DESC LIMIT ?",
+            (onb_id, after_rowid, limit),
+        ).fetchall()
+    return alive, [(rowid, f"[{_fmt_ts(ts)}] {msg}") for rowid, ts, msg in reversed(rows)]
+
+
+@lru_cache(maxsize=1024)
+def _fmt_ts(ts: int) -> str:
+    # Várias linhas caem no mesmo segundo, e cada polling do console reformata até 200 linhas
+    return time.strftime("%H:%M:%S", time.localtime(ts))
+
+
+def _purge_stale_onb(max_age: int = _SESSION_TTL_SECONDS) -> int:
+    """Apaga sessões abandonadas (e logs órfãos); retorna quantas sessões foram removidas."""
+    cutoff = int(time.time()) - max_age
+    with _tx() as db:
+        ids = [row[0] for row in db.execute(
+            "SELECT id FROM onboarding WHERE created_at < ? AND status != 'DONE'", (cutoff,)
+        )]
+        db.executemany("DELETE FROM onboarding WHERE id = ?", [(i,) for i in ids])
+        db.execute("DELETE FROM onboarding_log WHERE id NOT IN (SELECT id FROM onboarding)")
+    for onb_id in ids:
+        _drop_client(onb_id)
+    return len(ids)
+
+
+# -----------------------------
+# Clientes instagrapi (reaproveitados entre iniciar/confirmar)
+# -----------------------------
+# Mantém o mesmo Client (sessão HTTP, cookies, device/uuid) da mesma sessão de onboarding:
+# a confirmação do código reaproveita as conexões keep-alive já abertas com o Instagram.
+# Cada Client vem com um lock próprio: um "Confirmar" enviado duas vezes não pode rodar
+# login/challenge_resolve em paralelo sobre o mesmo estado do instagrapi.
+_MAX_CLIENTS = 64
+_CLIENTS: "OrderedDict[str, Tuple[Client, threading.Lock]]" = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def _get_client(onb_id: str) -> Tuple[Client, threading.Lock]:
+    with _clients_lock:
+        entry = _CLIENTS.get(onb_id)
+        if entry is None:
+            entry = _CLIENTS[onb_id] = (Client(), threading.Lock())
+            _evict_clients(keep=onb_id)
+        else:
+            _CLIENTS.move_to_end(onb_id)
+        return entry
+
+
+def _evict_clients(keep: str) -> None:
+    # Chamado com _clients_lock: descarta os mais antigos, mas nunca um Client em uso
+    # (perderia o estado do challenge e liberaria um segundo login em paralelo) nem o recém-criado.
+    # Se todos estiverem em uso, o cache passa do limite até alguém liberar.
+    excess = len(_CLIENTS) - _MAX_CLIENTS
+    if excess <= 0:
+        return
+    idle = [k for k, (_, lock) in _CLIENTS.items() if k != keep and not lock.locked()]
+    for onb_id in idle[:excess]:
+        del _CLIENTS[onb_id]
+
+
+@contextmanager
+def _session_client(onb_id: str) -> Iterator[Optional[Client]]:
+    """Client exclusivo da sessão durante o bloco; None se outra request já o está usando."""
+    cl, lock = _get_client(onb_id)
+    if not lock.acquire(blocking=False):
+        yield None
         return
-    ts = time.strftime("%H:%M:%S")
-    data.setdefault("logs", []).append(f"[{ts}] {msg}")
-    _save_onb(onb_id, data)
+    try:
+        yield cl
+    finally:
+        lock.release()
+
+
+def _drop_client(onb_id: str) -> None:
+    with _clients_lock:
+        _CLIENTS.pop(onb_id, None)
 
 
 # -----------------------------
-# HTML base + componentes
+# Templates HTML (Jinja2, compilados uma única vez no import)
 # -----------------------------
-def _html_base(body: str, title: str = "Adicionar conta Instagram") -> HTMLResponse:
-    html = f"""<!doctype html>
+BASE_TMPL = """<!doctype html>
 <html lang="pt-br"><head>
 <meta charset="utf-8" />
 <meta name="viewport" content="width=device-width,initial-scale=1" />
-<title>{title}</title>
-<style>
-  body {{ font-family: system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif; margin:24px; color:#111; }}
-  .container {{ max-width: 760px; margin:0 auto; }}
-  .card {{ padding: 24px; border:1px solid #e5e7eb; border-radius: 12px; box-shadow: 0 2px 8px rgba(0,0,0,.05); }}
-  h1 {{ font-size: 22px; margin: 0 0 16px; }}
-  label {{ display:block; font-size: 14px; margin: 12px 0 6px; color:#374151; }}
-  input {{ width:100%; padding:10px 12px; border:1px solid #d1d5db; border-radius: 10px; font-size: 14px; }}
-  button {{ margin-top:16px; padding:12px 16px; border:0; border-radius:10px; background:#111827; color:#fff; font-weight:600; cursor:pointer; }}
-  a.btn, form.inline {{ display:inline-block; margin-top:12px; margin-right:10px; }}
-  .btn-secondary {{ background:#334155; color:#fff; padding:10px 14px; border-radius:10px; text-decoration:none; }}
-  .muted {{ color:#6b7280; font-size:12px; margin-top:8px; }}
-  .ok {{ background:#065f46; color:#fff; padding:10px 12px; border-radius:8px; }}
-  .err {{ background:#7f1d1d; color:#fff; padding:10px 12px; border-radius:8px; }}
-  .info {{ background:#1f2937; color:#fff; padding:10px 12px; border-radius:8px; }}
-  .console {{ margin-top:16px; background:#0b1020; color:#c9d1ff; padding:12px; border-radius:10px; font-family:ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas,"Liberation Mono","Courier New", monospace; font-size:12px; white-space:pre-wrap; max-height:260px; overflow:auto; }}
-  .row {{ display:flex; gap:12px; align-items:center; flex-wrap:wrap; }}
-</style>
+<title>{{ title }}</title>
+<link rel="stylesheet" href="/static/onboarding.css?v=1" />
 </head><body><div class="container"><div class="card">
-{body}
+{% block content %}{% endblock %}
 </div></div></body></html>"""
-    return HTMLResponse(html)
-
-
-def _console(logs: List[str]) -> str:
-    if not logs:
-        return '<div class="console">[console] aguardando eventos…</div>'
-    return '<div class="console">' + "\n".join(logs[-200:]) + "</div>"
 
+CONSOLE_TMPL = """<div class="console" id="console">
+{%- if logs %}{{ logs | join("\\n") }}{% else %}[console] aguardando eventos…{% endif -%}
+</div>
+{% if onb_id %}
+<script>
+(function () {
+  const src = new EventSource("/adicionar-insta/stream/" + encodeURIComponent({{ onb_id | tojson }}));
+  const el = document.getElementById("console");
+  let fresh = true;  // o primeiro evento traz o histórico e substitui o conteúdo renderizado
+  src.onmessage = function (e) {
+    if (fresh) { el.textContent = ""; }
+    el.append((fresh ? "" : "\\n") + e.data);
+    fresh = false;
+    el.scrollTop = el.scrollHeight;
+  };
+  src.addEventListener("end", function () { src.close(); });
+})();
+</script>
+{% endif %}"""
+
+CODE_FORM_TMPL = """<form method="POST" action="/adicionar-insta/confirmar">
+  <input type="hidden" name="onboarding_id" value="{{ onb_id }}" />
+  <label>{{ code_label }}</label>
+  <input name="code" required placeholder="6 dígitos" />
+  <button type="submit">Confirmar</button>
+</form>
+<form class="inline" method="POST" action="/adicionar-insta/cancelar">
+  <input type="hidden" name="onboarding_id" value="{{ onb_id }}" />
+  <button type="submit">Cancelar</button>
+</form>
+"""
 
-# -----------------------------
-# UI: formulário inicial
-# -----------------------------
-@router.get("/adicionar-insta", response_class=HTMLResponse, summary="[UI] Formulário para adicionar conta")
-async def ui_add_account(request: Request):
-    body = f"""
+FORM_TMPL = """{% extends "base" %}
+{% block content %}
 <h1>Adicionar conta do Instagram</h1>
 <form method="POST" action="/adicionar-insta/iniciar">
   <label>Username (sem @)</label>
@@ -140,282 +324,365 @@ async def ui_add_account(request: Request):
   <button type="submit">Conectar conta</button>
   <div class="muted">Se a conta exigir verificação (código por e-mail/SMS/2FA), pediremos o código no próximo passo.</div>
 </form>
-"""
-    return _html_base(body, title="Adicionar conta do Instagram")
+{% endblock %}"""
+
+NEED_CODE_TMPL = """{% extends "base" %}
+{% block content %}
+{% if flow == "TWO_FACTOR" %}
+<h1>Verificação em duas etapas (2FA)</h1>
+<p class="info">Informe o código 2FA para concluir o login de @{{ username }}.</p>
+{% else %}
+<h1>Verificação necessária (Challenge)</h1>
+<p class="info">Enviamos/solicitamos um código via e-mail ou SMS. Insira abaixo para concluir.</p>
+{% endif %}
+{{ code_form }}
+{% include "console" %}
+{% endblock %}"""
+
+OK_TMPL = """{% extends "base" %}
+{% block content %}
+<h1>{{ heading }}</h1>
+<p class="ok">✅ @{{ username }} pronta para uso.</p>
+<div class="row">
+  <a class="btn-secondary" href="/pool-status">Ver status do pool</a>
+  <a class="btn-secondary" href="/docs">Abrir Swagger</a>
+  <a class="btn-secondary" href="/adicionar-insta">Adicionar outra conta</a>
+</div>
+{% endblock %}"""
+
+ERR_TMPL = """{% extends "base" %}
+{% block content %}
+<h1>{{ heading }}</h1>
+<p class="err">{{ message }}</p>
+{% if onb_id %}
+{{ code_form }}
+{% else %}
+<a class="btn-secondary" href="/adicionar-insta">Tentar novamente</a>
+{% endif %}
+{% include "console" %}
+{% endblock %}"""
+
+MSG_TMPL = """{% extends "base" %}
+{% block content %}
+<h1>{{ heading }}</h1>
+<p class="{{ css_class }}">{{ message }}</p>
+<a class="btn-secondary" href="/adicionar-insta">{{ link_label }}</a>
+{% endblock %}"""
+
+_env = Environment(
+    loader=DictLoader({
+        "base": BASE_TMPL,
+        "console": CONSOLE_TMPL,
+        "code_form": CODE_FORM_TMPL,
+        "form": FORM_TMPL,
+        "need_code": NEED_CODE_TMPL,
+        "ok": OK_TMPL,
+        "err": ERR_TMPL,
+        "msg": MSG_TMPL,
+    }),
+    autoescape=True,
+    auto_reload=False,
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+_TMPLS = {name: _env.get_template(name) for name in ("code_form", "form", "need_code", "ok", "err", "msg")}
+
+# Rótulo do campo de código: um por fluxo, mais a variante da tela de nova tentativa
+_CODE_LABELS = {"TWO_FACTOR": "Código 2FA", "CHALLENGE": "Código recebido", "RETRY": "Tentar novamente"}
+
+
+def _render(name: str, title: str, **ctx: Any) -> HTMLResponse:
+    return HTMLResponse(_TMPLS[name].render(title=title, **ctx))
+
+
+@lru_cache(maxsize=64)
+def _render_code_form(onb_id: str, label_key: str) -> Markup:
+    # Formulário de código + cancelar só depende da sessão e do rótulo do campo: retries do
+    # mesmo usuário reaproveitam o HTML, e só mensagem/logs são renderizados a cada request.
+    return Markup(_TMPLS["code_form"].render(onb_id=onb_id, code_label=_CODE_LABELS[label_key]))
+
+
+# Páginas sem nenhuma parte variável: renderizadas uma vez no import
+_FORM_HTML = _TMPLS["form"].render(title="Adicionar conta do Instagram")
+_EXPIRED_HTML = _TMPLS["msg"].render(
+    title="Sessão expirada", heading="Verificação", css_class="err",
+    message="Sessão de onboarding não encontrada ou expirada.", link_label="Voltar",
+)
+_BUSY_HTML = _TMPLS["msg"].render(
+    title="Verificação em andamento", heading="Verificação", css_class="info",
+    message="Esta sessão já está sendo processada em outra requisição. Aguarde o resultado.", link_label="Voltar",
+)
+_CANCELED_HTML = _TMPLS["msg"].render(
+    title="Cancelado", heading="Onboarding cancelado", css_class="info",
+    message="A sessão foi encerrada.", link_label="Voltar ao início",
+)
+
+
+def _account_pool(service: CollectionService = Depends(get_collection_service)) -> AccountPool:
+    """Dependência: pool de contas do CollectionService (resolvida pelo FastAPI, cacheada por request)."""
+    return service.account_pool
+
+
+# -----------------------------
+# UI: formulário inicial
+# -----------------------------
+@router.get("/adicionar-insta", response_class=HTMLResponse, summary="[UI] Formulário para adicionar conta")
+async def ui_add_account(request: Request):
+    return HTMLResponse(_FORM_HTML)
 
 
 # -----------------------------
 # Iniciar login (NÃO pedir código no terminal)
 # -----------------------------
+# Sem async: cl.login & cia. são bloqueantes (rede), então o FastAPI roda o handler no threadpool
+# em vez de travar o event loop para todos os outros usuários.
 @router.post("/adicionar-insta/iniciar", response_class=HTMLResponse, summary="[UI] Iniciar login (pode pedir código)")
-async def ui_start_add_account(
+def ui_start_add_account(
     username: str = Form(...),
     password: str = Form(...),
     proxy: Optional[str] = Form(None),
+    pool: AccountPool = Depends(_account_pool),
 ):
     onb_id = _new_onb(username, password, proxy)
-    _append_log(onb_id, f"Iniciando login para @{username}")
+    msgs = [f"Iniciando login para @{username}"]
     if proxy:
-        _append_log(onb_id, f"Proxy informado: {proxy}")
+        msgs.append(f"Proxy informado: {proxy}")
+    _append_logs(onb_id, msgs)
 
-    cl = Client()
-    if proxy:
-        try:
-            cl.set_proxy(proxy)
-            _append_log(onb_id, "Proxy configurado com sucesso")
-        except Exception as e:
-            _append_log(onb_id, f"[WARN] Proxy inválido: {e}")
+    with _session_client(onb_id) as cl:
+        if cl is None:
+            return HTMLResponse(_BUSY_HTML)
 
-    # Handler de pré-login: impede prompt no terminal e devolve o fluxo à UI
-    try:
-        from instagrapi.mixins.challenge import ChallengeChoice
-    except Exception:
-        ChallengeChoice = object  # fallback tipagem
+        if proxy:
+            try:
+                cl.set_proxy(proxy)
+                _append_log(onb_id, "Proxy configurado com sucesso")
+            except Exception as e:
+                _append_log(onb_id, f"[WARN] Proxy inválido: {e}")
 
-    def _prelogin_handler(_u: str, choice: "ChallengeChoice"):
-        try:
-            chosen = getattr(choice, "value", str(choice))
-        except Exception:
-            chosen = str(choice)
-        _append_log(onb_id, f"Challenge detectado (método: {chosen}). Aguardando código na interface…")
-        # Interrompe aqui para NÃO pedir no terminal:
-        raise ChallengeRequired("awaiting_code_from_ui")
+        # Handler de pré-login: impede prompt no terminal e devolve o fluxo à UI
+        def _prelogin_handler(_u: str, choice: "ChallengeChoice"):
+            try:
+                chosen = getattr(choice, "value", str(choice))
+            except Exception:
+                chosen = str(choice)
+            _append_log(onb_id, f"Challenge detectado (método: {chosen}). Aguardando código na interface…")
+            # Interrompe aqui para NÃO pedir no terminal:
+            raise ChallengeRequired("awaiting_code_from_ui")
 
-    cl.challenge_code_handler = _prelogin_handler
+        cl.challenge_code_handler = _prelogin_handler
 
-    try:
-        _append_log(onb_id, "Tentando login direto…")
-        ok = cl.login(username, password)
-        if ok:
-            _append_log(onb_id, "Login concluído com sucesso")
-            pool = get_collection_service().account_pool
-            added = pool.add_account(username, password, proxy)
-            _append_log(onb_id, "Conta adicionada ao pool" if added else "Conta já no pool ou não pôde ser adicionada novamente")
-            _delete_onb(onb_id)
-            body = f"""
-<h1>Conta adicionada</h1>
-<p class="ok">✅ @{username} pronta para uso.</p>
-<div class="row">
-  <a class="btn-secondary" href="/pool-status">Ver status do pool</a>
-  <a class="btn-secondary" href="/docs">Abrir Swagger</a>
-  <a class="btn-secondary" href="/adicionar-insta">Adicionar outra conta</a>
-</div>
-"""
-            return _html_base(body, title="Conta adicionada")
-
-        # Se não retornou ok, força fluxo de verificação
-        raise LoginRequired("Falha no login (sem desafio)")
-
-    except TwoFactorRequired:
-        data = _load_onb(onb_id) or {}
-        data["status"] = "NEED_CODE"
-        data["flow"] = "TWO_FACTOR"
-        _save_onb(onb_id, data)
-        _append_log(onb_id, "⚠️ 2FA requerido (use o código do app autenticador/SMS)")
-        logs = (_load_onb(onb_id) or {}).get("logs", [])
-        body = f"""
-<h1>Verificação em duas etapas (2FA)</h1>
-<p class="info">Informe o código 2FA para concluir o login de @{username}.</p>
-<form method="POST" action="/adicionar-insta/confirmar">
-  <input type="hidden" name="onboarding_id" value="{onb_id}" />
-  <label>Código 2FA</label>
-  <input name="code" required placeholder="6 dígitos" />
-  <button type="submit">Confirmar</button>
-</form>
-<form class="inline" method="POST" action="/adicionar-insta/cancelar">
-  <input type="hidden" name="onboarding_id" value="{onb_id}" />
-  <button type="submit">Cancelar</button>
-</form>
-{_console(logs)}
-"""
-        return _html_base(body, title="Confirmar 2FA")
-
-    except ChallengeRequired:
-        data = _load_onb(onb_id) or {}
-        data["status"] = "NEED_CODE"
-        data["flow"] = "CHALLENGE"
-        _save_onb(onb_id, data)
-        _append_log(onb_id, "⚠️ Challenge requerido — Instagram enviará um código (email/SMS)")
-        _append_log(onb_id, "Dica: verifique também a pasta de SPAM / promoções do e-mail.")
-        logs = (_load_onb(onb_id) or {}).get("logs", [])
-        body = f"""
-<h1>Verificação necessária (Challenge)</h1>
-<p class="info">Enviamos/solicitamos um código via e-mail ou SMS. Insira abaixo para concluir.</p>
-<form method="POST" action="/adicionar-insta/confirmar">
-  <input type="hidden" name="onboarding_id" value="{onb_id}" />
-  <label>Código recebido</label>
-  <input name="code" required placeholder="6 dígitos" />
-  <button type="submit">Confirmar</button>
-</form>
-<form class="inline" method="POST" action="/adicionar-insta/cancelar">
-  <input type="hidden" name="onboarding_id" value="{onb_id}" />
-  <button type="submit">Cancelar</button>
-</form>
-{_console(logs)}
-"""
-        return _html_base(body, title="Verificar código")
+        try:
+            _append_log(onb_id, "Tentando login direto…")
+            ok = cl.login(username, password)
+            if ok:
+                _append_log(onb_id, "Login concluído com sucesso")
+                added = pool.add_account(username, password, proxy)
+                _append_log(onb_id, "Conta adicionada ao pool" if added else "Conta já no pool ou não pôde ser adicionada novamente")
+                _delete_onb(onb_id)
+                return _render("ok", title="Conta adicionada", heading="Conta adicionada", username=username)
+
+            # Se não retornou ok, força fluxo de verificação
+            raise LoginRequired("Falha no login (sem desafio)")
+
+        except TwoFactorRequired:
+            data = {"status": "NEED_CODE", "flow": "TWO_FACTOR"}
+            _push_log(data, "⚠️ 2FA requerido (use o código do app autenticador/SMS)")
+            _save_onb(onb_id, data)
+            logs = _load_onb_logs(onb_id)
+            return _render(
+                "need_code", title="Confirmar 2FA", flow="TWO_FACTOR", username=username, onb_id=onb_id,
+                code_form=_render_code_form(onb_id, "TWO_FACTOR"), logs=logs,
+            )
+
+        except ChallengeRequired:
+            data = {"status": "NEED_CODE", "flow": "CHALLENGE"}
+            _push_log(data, "⚠️ Challenge requerido — Instagram enviará um código (email/SMS)")
+            _push_log(data, "Dica: verifique também a pasta de SPAM / promoções do e-mail.")
+            _save_onb(onb_id, data)
+            logs = _load_onb_logs(onb_id)
+            return _render(
+                "need_code", title="Verificar código", flow="CHALLENGE", username=username, onb_id=onb_id,
+                code_form=_render_code_form(onb_id, "CHALLENGE"), logs=logs,
+            )
 
-    except Exception as e:
-        _append_log(onb_id, f"[ERRO] Falha ao iniciar o login: {e}")
-        logs = (_load_onb(onb_id) or {}).get("logs", [])
-        body = f"""
-<h1>Adicionar conta do Instagram</h1>
-<p class="err">Falha ao iniciar o login: {str(e)}</p>
-<a class="btn-secondary" href="/adicionar-insta">Tentar novamente</a>
-{_console(logs)}
-"""
-        return _html_base(body, title="Erro")
+        except Exception as e:
+            _append_log(onb_id, f"[ERRO] Falha ao iniciar o login: {e}")
+            logs = _load_onb_logs(onb_id)
+            return _render(
+                "err", title="Erro", heading="Adicionar conta do Instagram",
+                message=f"Falha ao iniciar o login: {e}", logs=logs,
+            )
 
 
 # -----------------------------
 # Confirmar código (CHALLENGE/2FA)
 # -----------------------------
 @router.post("/adicionar-insta/confirmar", response_class=HTMLResponse, summary="[UI] Confirmar código e concluir")
-async def ui_confirm_code(
+def ui_confirm_code(
     onboarding_id: str = Form(...),
     code: str = Form(...),
+    pool: AccountPool = Depends(_account_pool),
 ):
     data = _load_onb(onboarding_id)
     if not data:
-        body = """
-<h1>Verificação</h1>
-<p class="err">Sessão de onboarding não encontrada ou expirada.</p>
-<a class="btn-secondary" href="/adicionar-insta">Voltar</a>
-"""
-        return _html_base(body, title="Sessão expirada")
+        return HTMLResponse(_EXPIRED_HTML)
 
     username = data["username"]
     password = data["password"]
     proxy = data.get("proxy")
     flow = data.get("flow", "CHALLENGE")  # default CHALLENGE
 
-    _append_log(onboarding_id, f"Recebido código para @{username}. Tentando concluir {flow}…")
-
-    cl = Client()
-    if proxy:
-        try:
-            cl.set_proxy(proxy)
-            _append_log(onboarding_id, "Proxy configurado novamente para concluir verificação")
-        except Exception as e:
-            _append_log(onboarding_id, f"[WARN] Proxy inválido ao confirmar: {e}")
+    with _session_client(onboarding_id) as cl:
+        if cl is None:
+            return HTMLResponse(_BUSY_HTML)
 
-    try:
-        if flow == "TWO_FACTOR":
-            # Dispara estado 2FA, se necessário
-            try:
-                cl.login(username, password)
-            except TwoFactorRequired:
-                pass
+        _append_log(onboarding_id, f"Recebido código para @{username}. Tentando concluir {flow}…")
 
-            ok = False
+        if proxy:
             try:
-                ok = bool(cl.two_factor_login(code))
+                cl.set_proxy(proxy)
+                _append_log(onboarding_id, "Proxy configurado novamente para concluir verificação")
             except Exception as e:
-                _append_log(onboarding_id, f"[WARN] two_factor_login falhou: {e}")
-                ok = False
+                _append_log(onboarding_id, f"[WARN] Proxy inválido ao confirmar: {e}")
 
-            if not ok:
-                raise LoginRequired("2FA não aceito")
+        try:
+            if flow == "TWO_FACTOR":
+                # Dispara estado 2FA, se necessário
+                try:
+                    cl.login(username, password)
+                except TwoFactorRequired:
+                    pass
 
-            _append_log(onboarding_id, "2FA validado com sucesso")
+                ok = False
+                try:
+                    ok = bool(cl.two_factor_login(code))
+                except Exception as e:
+                    _append_log(onboarding_id, f"[WARN] two_factor_login falhou: {e}")
+                    ok = False
 
-        else:
-            # CHALLENGE: usar handler que retorna o código informado e fallback explicitamente
-            try:
-                from instagrapi.mixins.challenge import ChallengeChoice
-            except Exception:
-                ChallengeChoice = object
+                if not ok:
+                    raise LoginRequired("2FA não aceito")
 
-            def _handler(_u: str, choice: "ChallengeChoice"):
-                try:
-                    chosen = getattr(choice, "value", str(choice))
-                except Exception:
-                    chosen = str(choice)
-                _append_log(onboarding_id, f"Instagram solicitou código via método: {chosen}")
-                return code
+                _append_log(onboarding_id, "2FA validado com sucesso")
 
-            cl.challenge_code_handler = _handler
+            else:
+                # CHALLENGE: usar handler que retorna o código informado e fallback explicitamente
+                def _handler(_u: str, choice: "ChallengeChoice"):
+                    try:
+                        chosen = getattr(choice, "value", str(choice))
+                    except Exception:
+                        chosen = str(choice)
+                    _append_log(onboarding_id, f"Instagram solicitou código via método: {chosen}")
+                    return code
 
-            ok = False
-            try:
-                ok = bool(cl.login(username, password))
-            except ChallengeRequired:
-                ok = False
-            except Exception as e:
-                _append_log(onboarding_id, f"[WARN] login com handler falhou: {e}")
-                ok = False
+                cl.challenge_code_handler = _handler
 
-            # Fallback para versões que exigem resolver explicitamente
-            if not ok:
+                ok = False
                 try:
-                    # Algumas versões usam challenge_resolve(code) ou challenge_resolve(code=...)
-                    try:
-                        resolved = cl.challenge_resolve(code)
-                    except TypeError:
-                        resolved = cl.challenge_resolve(code=code)
-                    ok = bool(resolved)
+                    ok = bool(cl.login(username, password))
+                except ChallengeRequired:
+                    ok = False
                 except Exception as e:
-                    _append_log(onboarding_id, f"[WARN] challenge_resolve falhou: {e}")
+                    _append_log(onboarding_id, f"[WARN] login com handler falhou: {e}")
                     ok = False
 
-            if not ok:
-                raise LoginRequired("Challenge não aceito")
+                # Fallback para versões que exigem resolver explicitamente
+                if not ok:
+                    try:
+                        # Algumas versões usam challenge_resolve(code) ou challenge_resolve(code=...)
+                        try:
+                            resolved = cl.challenge_resolve(code)
+                        except TypeError:
+                            resolved = cl.challenge_resolve(code=code)
+                        ok = bool(resolved)
+                    except Exception as e:
+                        _append_log(onboarding_id, f"[WARN] challenge_resolve falhou: {e}")
+                        ok = False
+
+                if not ok:
+                    raise LoginRequired("Challenge não aceito")
+
+                _append_log(onboarding_id, "Challenge validado com sucesso")
+
+            # Registrar no pool
+            added = pool.add_account(username, password, proxy)
+            _append_log(
+                onboarding_id,
+                "Conta adicionada ao pool" if added else "Conta já estava no pool ou não pôde ser registrada novamente"
+            )
+            _delete_onb(onboarding_id)
 
-            _append_log(onboarding_id, "Challenge validado com sucesso")
+            return _render("ok", title="Concluído", heading="Tudo certo!", username=username)
 
-        # Registrar no pool
-        pool = get_collection_service().account_pool
-        added = pool.add_account(username, password, proxy)
-        _append_log(
-            onboarding_id,
-            "Conta adicionada ao pool" if added else "Conta já estava no pool ou não pôde ser registrada novamente"
-        )
-        _delete_onb(onboarding_id)
+        except Exception as e:
+            _append_log(onboarding_id, f"[ERRO] Falha na confirmação do código: {e}")
+            logs = _load_onb_logs(onboarding_id)
+            return _render(
+                "err", title="Erro na verificação", heading="Verificação",
+                message=f"Não foi possível validar o código: {e}", onb_id=onboarding_id,
+                code_form=_render_code_form(onboarding_id, "RETRY"), logs=logs,
+            )
 
-        body = f"""
-<h1>Tudo certo!</h1>
-<p class="ok">✅ @{username} pronta para uso.</p>
-<div class="row">
-  <a class="btn-secondary" href="/pool-status">Ver status do pool</a>
-  <a class="btn-secondary" href="/docs">Abrir Swagger</a>
-  <a class="btn-secondary" href="/adicionar-insta">Adicionar outra conta</a>
-</div>
-"""
-        return _html_base(body, title="Concluído")
-
-    except Exception as e:
-        _append_log(onboarding_id, f"[ERRO] Falha na confirmação do código: {e}")
-        logs = (_load_onb(onboarding_id) or {}).get("logs", [])
-        body = f"""
-<h1>Verificação</h1>
-<p class="err">Não foi possível validar o código: {str(e)}</p>
-<form method="POST" action="/adicionar-insta/confirmar">
-  <input type="hidden" name="onboarding_id" value="{onboarding_id}" />
-  <label>Tentar novamente</label>
-  <input name="code" required placeholder="6 dígitos" />
-  <button type="submit">Confirmar</button>
-</form>
-<form class="inline" method="POST" action="/adicionar-insta/cancelar">
-  <input type="hidden" name="onboarding_id" value="{onboarding_id}" />
-  <button type="submit">Cancelar</button>
-</form>
-{_console(logs)}
-"""
-        return _html_base(body, title="Erro na verificação")
+
+# -----------------------------
+# Logs da sessão (JSON e SSE)
+# -----------------------------
+# Sem async: as consultas pegam _db_lock / esperam o lock do SQLite (até 10s) — no threadpool,
+# não travam o event loop.
+@router.get("/adicionar-insta/logs/{onb_id}", summary="[UI] Logs da sessão de onboarding")
+def ui_logs(onb_id: str):
+    if not _load_onb(onb_id):
+        raise HTTPException(status_code=404, detail="Sessão de onboarding não encontrada")
+    return {"logs": _load_onb_logs(onb_id)}
+
+
+async def _tail_logs(onb_id: str, after_rowid: int) -> AsyncIterator[Dict[str, str]]:
+    # "tail -f" da tabela de logs; encerra quando a sessão some (concluída/cancelada/expirada)
+    while True:
+        alive, rows = await run_in_threadpool(_load_onb_logs_since, onb_id, after_rowid)
+        for rowid, line in rows:
+            after_rowid = rowid
+            yield {"id": str(rowid), "data": line}
+        if not alive:
+            yield {"event": "end", "data": ""}
+            return
+        await asyncio.sleep(0.5)
+
+
+@router.get("/adicionar-insta/stream/{onb_id}", summary="[UI] Stream (SSE) dos logs da sessão de onboarding")
+async def ui_logs_stream(onb_id: str, request: Request):
+    if not await run_in_threadpool(_load_onb, onb_id):
+        raise HTTPException(status_code=404, detail="Sessão de onboarding não encontrada")
+    # Reconexão automática do EventSource: continua de onde parou
+    try:
+        after_rowid = int(request.headers.get("last-event-id", 0))
+    except ValueError:
+        after_rowid = 0
+    return EventSourceResponse(_tail_logs(onb_id, after_rowid))
 
 
 # -----------------------------
 # Cancelar sessão
 # -----------------------------
 @router.post("/adicionar-insta/cancelar", response_class=HTMLResponse, summary="[UI] Cancelar sessão de onboarding")
-async def ui_cancel(onboarding_id: str = Form(...)):
-    data = _load_onb(onboarding_id)
-    if data:
-        _append_log(onboarding_id, "Sessão cancelada pelo usuário")
-        _delete_onb(onboarding_id)
-    body = """
-<h1>Onboarding cancelado</h1>
-<p class="info">A sessão foi encerrada.</p>
-<a class="btn-secondary" href="/adicionar-insta">Voltar ao início</a>
-"""
-    return _html_base(body, title="Cancelado")
+def ui_cancel(onboarding_id: str = Form(...)):
+    # Apaga direto e usa o rowcount, em vez de consultar antes (o log da sessão seria apagado junto)
+    if _delete_onb(onboarding_id):
+        logger.info(f"Onboarding {onboarding_id} cancelado pelo usuário")
+    return HTMLResponse(_CANCELED_HTML)
+
+
+# -----------------------------
+# Limpeza periódica de sessões
+# -----------------------------
+async def session_gc_loop() -> None:
+    """Task de fundo (iniciada no lifespan da app) que expira sessões de onboarding abandonadas."""
+    while True:
+        await asyncio.sleep(_GC_INTERVAL_SECONDS)
+        try:
+            removed = await run_in_threadpool(_purge_stale_onb)
+            if removed:
+                logger.info(f"🧹 {removed} sessões de onboarding expiradas removidas")
+        except Exception as e:
+            logger.warning(f"⚠️ Erro na limpeza de sessões de onboarding: {e}")
@@ -0,0 +1,10 @@
+# tests/conftest.py
+"""
+Configuração compartilhada dos testes
+"""
+import os
+import tempfile
+
+# app.api.onboarding abre o SQLite em SESSION_DIR no import: sempre usar um diretório
+# temporário (nunca o SESSION_DIR do ambiente), antes de qualquer import do app
+os.environ["SESSION_DIR"] = tempfile.mkdtemp(prefix="onboarding-tests-")
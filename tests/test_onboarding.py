@@ -0,0 +1,179 @@
+# tests/test_onboarding.py
+"""
+Testes do onboarding web (/adicionar-insta) com Client do instagrapi simulado
+"""
+import re
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from instagrapi.exceptions import ChallengeRequired
+
+from app.api import onboarding as onb
+
+
+class FakeClient:
+    """Simula o instagrapi: login sempre cai em challenge; só o código '123456' resolve."""
+
+    def __init__(self, *args, **kwargs):
+        self.challenge_code_handler = None
+
+    def set_proxy(self, dsn):
+        return True
+
+    def login(self, username, password):
+        code = self.challenge_code_handler(username, "EMAIL")
+        return code == "123456"
+
+    def challenge_resolve(self, code):
+        return False
+
+
+class FakePool:
+    def __init__(self):
+        self.added = []
+
+    def add_account(self, username, password, proxy=None):
+        self.added.append(username)
+        return True
+
+
+@pytest.fixture
+def pool():
+    return FakePool()
+
+
+@pytest.fixture
+def client(monkeypatch, pool):
+    monkeypatch.setattr(onb, "Client", FakeClient)
+    onb._CLIENTS.clear()
+    app = FastAPI()
+    app.include_router(onb.router)
+    app.dependency_overrides[onb._account_pool] = lambda: pool
+    return TestClient(app)
+
+
+def _count(sql, *params):
+    return onb._db.execute(sql, params).fetchone()[0]
+
+
+def _onboarding_id(html):
+    return re.search(r'name="onboarding_id" value="([^"]+)"', html).group(1)
+
+
+def test_challenge_retry_success_deletes_session_and_logs(client, pool):
+    res = client.post("/adicionar-insta/iniciar", data={"username": "<conta>", "password": "x"})
+    assert res.status_code == 200
+    assert "Verificação necessária (Challenge)" in res.text
+    assert "@&lt;conta&gt;" in res.text  # autoescape
+    onb_id = _onboarding_id(res.text)
+    assert onb._load_onb(onb_id)["status"] == "NEED_CODE"
+    assert client.get(f"/adicionar-insta/logs/{onb_id}").json()["logs"]
+
+    res = client.post("/adicionar-insta/confirmar", data={"onboarding_id": onb_id, "code": "000000"})
+    assert "Não foi possível validar o código" in res.text
+    assert _onboarding_id(res.text) == onb_id
+
+    res = client.post("/adicionar-insta/confirmar", data={"onboarding_id": onb_id, "code": "123456"})
+    assert "Tudo certo!" in res.text
+    assert pool.added == ["<conta>"]
+    assert onb._load_onb(onb_id) is None
+    assert _count("SELECT COUNT(*) FROM onboarding_log WHERE id = ?", onb_id) == 0
+    assert onb_id not in onb._CLIENTS
+    assert client.get(f"/adicionar-insta/logs/{onb_id}").status_code == 404
+
+
+def test_trim_logs_keeps_max_logs():
+    onb_id = onb._new_onb("trim", "x", None)
+    onb._append_logs(onb_id, [f"linha {i}" for i in range(onb._MAX_LOGS + 50)])
+    onb._append_log(onb_id, "ultima")
+
+    assert _count("SELECT COUNT(*) FROM onboarding_log WHERE id = ?", onb_id) == onb._MAX_LOGS
+    assert onb._load_onb_logs(onb_id, limit=onb._MAX_LOGS)[-1].endswith("ultima")
+    onb._delete_onb(onb_id)
+
+
+def test_purge_stale_onb_removes_expired_sessions_and_orphan_logs():
+    stale = onb._new_onb("velha", "x", None)
+    fresh = onb._new_onb("nova", "x", None)
+    onb._append_log(stale, "log velho")
+    onb._append_log(fresh, "log novo")
+    onb._append_log("orfao", "sem sessão")
+    onb._db.execute("UPDATE onboarding SET created_at = 0 WHERE id = ?", (stale,))
+
+    assert onb._purge_stale_onb() >= 1
+
+    assert onb._load_onb(stale) is None
+    assert onb._load_onb(fresh) is not None
+    assert _count("SELECT COUNT(*) FROM onboarding_log WHERE id IN (?, ?)", stale, "orfao") == 0
+    assert onb._load_onb_logs(fresh)[-1].endswith("log novo")
+    onb._delete_onb(fresh)
+
+
+def test_client_cache_never_evicts_a_busy_session(monkeypatch):
+    monkeypatch.setattr(onb, "Client", FakeClient)
+    monkeypatch.setattr(onb, "_MAX_CLIENTS", 2)
+    onb._CLIENTS.clear()
+
+    with onb._session_client("em-uso") as busy:
+        assert busy is not None
+        onb._get_client("b")
+        onb._get_client("c")  # estoura o limite: "b" sai, "em-uso" fica
+
+        assert list(onb._CLIENTS) == ["em-uso", "c"]
+        with onb._session_client("em-uso") as again:
+            assert again is None  # concorrente continua bloqueado
+    onb._CLIENTS.clear()
+
+
+
+def _read_sse(res):
+    """Lê o stream SSE até o fim e devolve a lista de eventos (dicts campo -> valor)."""
+    events, current = [], {}
+    for line in res.iter_lines():
+        if line:
+            field, _, value = line.partition(": ")
+            current[field] = value
+        elif current:
+            events.append(current)
+            current = {}
+    return events
+
+
+def _delete_later(onb_id, delay=0.8):
+    # O TestClient só entrega o corpo quando o stream termina: apagar a sessão em paralelo
+    # faz o _tail_logs emitir "end" depois de enviar o histórico.
+    timer = threading.Timer(delay, onb._delete_onb, args=(onb_id,))
+    timer.start()
+    return timer
+
+
+def test_logs_stream_sends_rowids_ends_on_delete_and_resumes(client):
+    onb_id = onb._new_onb("stream", "x", None)
+    onb._append_logs(onb_id, ["um", "dois", "tres"])
+    rowids = [r[0] for r in onb._db.execute("SELECT rowid FROM onboarding_log WHERE id = ? ORDER BY rowid", (onb_id,))]
+
+    _delete_later(onb_id)
+    with client.stream("GET", f"/adicionar-insta/stream/{onb_id}") as res:
+        assert res.status_code == 200
+        events = _read_sse(res)
+    logs = [(int(e["id"]), e["data"].split("] ", 1)[1]) for e in events if "id" in e]
+    assert logs == list(zip(rowids, ["um", "dois", "tres"]))
+    assert events[-1]["event"] == "end"
+
+    # Sessão apagada: a reconexão do EventSource recebe 404 e para
+    assert client.get(f"/adicionar-insta/stream/{onb_id}").status_code == 404
+
+    # Retomada via Last-Event-ID: só chegam as linhas posteriores
+    onb_id = onb._new_onb("resume", "x", None)
+    onb._append_logs(onb_id, ["a", "b", "c"])
+    rowids = [r[0] for r in onb._db.execute("SELECT rowid FROM onboarding_log WHERE id = ? ORDER BY rowid", (onb_id,))]
+
+    _delete_later(onb_id)
+    with client.stream(
+        "GET", f"/adicionar-insta/stream/{onb_id}", headers={"Last-Event-ID": str(rowids[1])}
+    ) as res:
+        events = _read_sse(res)
+    assert [(int(e["id"]), e["data"].split("] ", 1)[1]) for e in events if "id" in e] == [(rowids[2], "c")]
+    assert events[-1]["event"] == "end"